@@ -1,24 +1,48 @@
-import os, json, difflib
-from typing import List, TypedDict, Optional
+import os, re, json, mmap, functools, operator
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, List, TypedDict, Optional
 from dotenv import load_dotenv
 
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage, ToolMessage
 from langgraph.graph import StateGraph, END
 from langchain_huggingface import HuggingFaceEndpoint
 
+try:
+    import orjson
+except ImportError:  # orjson yoksa stdlib json'a düş
+    orjson = None
+
+try:
+    import numpy as np
+    import faiss
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # semantik arama opsiyonel; yoksa kelime kümesi aramasına düş
+    faiss = None
+
 from tools import multiply, add, subtract, divide, modulus, wiki_search, web_search, arvix_search, get_youtube_transcript, transcribe_audio
 
 # --- Ayarlar ---
 load_dotenv()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SYSTEM_PROMPT_PATH = os.path.join(BASE_DIR, "system_prompt.txt")
-MEMORY_PATH = os.path.join(BASE_DIR, "memory.json")
+MEMORY_PATH = os.path.join(BASE_DIR, "memory.jsonl")
+LEGACY_MEMORY_PATH = os.path.join(BASE_DIR, "memory.json")
 MAX_MEMORY = 1000
+# Dosya bu sınırı aşınca son MAX_MEMORY kayda sıkıştırılır
+MEMORY_COMPACT_THRESHOLD = int(MAX_MEMORY * 1.2)
+# Hafızadaki soruların embedding'leri (float32, hafıza dosyasıyla satır satır aynı sırada)
+MEMORY_EMBEDDINGS_PATH = os.path.join(BASE_DIR, "memory.emb")
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+SIMILARITY_THRESHOLD = 0.9
+# Semantik arama yoksa kelime kümeleri arasındaki Jaccard benzerliği için eşik
+JACCARD_THRESHOLD = 0.85
 
 # --- System prompt ---
 with open(SYSTEM_PROMPT_PATH, "r") as f:
     system_prompt = f.read()
-sys_msg = SystemMessage(content=system_prompt)
+# Her turda değişmeyen prompt öneki bir kez hazırlanır
+SYSTEM_PREFIX = system_prompt + "\n"
 
 # --- Tools ve Tool Executor ---
 tools = [multiply, add, subtract, divide, modulus, wiki_search, web_search, arvix_search, get_youtube_transcript, transcribe_audio]
@@ -26,19 +50,23 @@ tools = [multiply, add, subtract, divide, modulus, wiki_search, web_search, arvi
 class SimpleToolExecutor:
     def __init__(self, tools):
         self.tools = {tool.name: tool for tool in tools}
+    def _run(self, call):
+        name, args = call['name'], call['args']
+        tool = self.tools.get(name)
+        if tool is None:
+            return f"Tool {name} not found."
+        try:
+            return tool.run(args)
+        except Exception as e:
+            return str(e)
     def invoke(self, tool_calls):
-        results = []
-        for call in tool_calls:
-            tool = self.tools.get(call['name'])
-            if tool:
-                try:
-                    result = tool.run(call['args'])
-                except Exception as e:
-                    result = str(e)
-                results.append(result)
-            else:
-                results.append(f"Tool {call['name']} not found.")
-        return results
+        # Araçlar G/Ç ağırlıklı (arama, API çağrıları); birden fazla çağrı
+        # paralel çalıştırılır, sonuçlar çağrı sırasını korur.
+        run = self._run
+        if len(tool_calls) <= 1:
+            return [run(call) for call in tool_calls]
+        with ThreadPoolExecutor(max_workers=len(tool_calls)) as executor:
+            return list(executor.map(run, tool_calls))
 
 tool_executor = SimpleToolExecutor(tools)
 
@@ -48,68 +76,363 @@ llm_with_tools = HuggingFaceEndpoint(
     huggingfacehub_api_token=os.getenv("HF_TOKEN")
 )
 
+# --- JSON yardımcıları (orjson varsa onu kullan) ---
+def _json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps(obj) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:  # ör. 64 bitten büyük tamsayılar
+            pass
+    return json.dumps(obj).encode("utf-8")
+
 # --- Hafıza işlemleri ---
+# Hafıza süreç içinde normalize soruya göre anahtarlanmış bir OrderedDict
+# olarak tutulur; en son kullanılan kayıt sondadır (LRU), sınır aşılınca en
+# eski kullanılan kayıt çıkarılır. Diskte satır başına bir kayıt olacak
+# şekilde JSONL olarak saklanır: yeni kayıtlar ve önbellek isabetleri dosyanın
+# sonuna eklenir, yüklemede aynı anahtarın son satırı geçerlidir ve kaydı sona
+# taşır. Tüm dosya yalnızca sıkıştırmada yazılır. Dosya dışarıdan değişirse
+# (mtime farkı) yeniden yüklenir.
+_MEMORY_CACHE: Optional[OrderedDict] = None
+_MEMORY_MTIME: Optional[float] = None
+_MEMORY_LINES = 0  # dosyadaki satır sayısı (tekrarlanan anahtarlar dahil)
+
+def _normalize_question(question: str) -> str:
+    return question.strip().lower()
+
+def _migrate_legacy_memory():
+    """Eski memory.json dosyasını bir kereliğine memory.jsonl'e dönüştürür."""
+    if os.path.exists(MEMORY_PATH) or not os.path.exists(LEGACY_MEMORY_PATH):
+        return
+    with open(LEGACY_MEMORY_PATH, "rb") as f:
+        memory = _json_loads(f.read())
+    _write_memory(memory[-MAX_MEMORY:])
+
+def _write_memory(entries):
+    tmp_path = MEMORY_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for entry in entries:
+            f.write(_json_dumps(entry) + b"\n")
+    os.replace(tmp_path, MEMORY_PATH)
+
+def _read_memory_lines():
+    """Hafıza dosyasını mmap ile satır satır okur.
+
+    Her satır yine ayrı bir bytes nesnesine kopyalanır; f.readlines()'a göre
+    fark yalnızca ara okuma tamponunun olmamasıdır.
+    """
+    with open(MEMORY_PATH, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:  # boş dosya eşlenemez
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return list(iter(mm.readline, b""))
+
+def _compact_memory():
+    """Dosyayı hafızadaki kayıtlarla, LRU sırasıyla ve tekrarsız yeniden yazar."""
+    global _MEMORY_LINES, _MEMORY_MTIME
+    _write_memory(_MEMORY_CACHE.values())
+    _MEMORY_LINES = len(_MEMORY_CACHE)
+    _MEMORY_MTIME = os.stat(MEMORY_PATH).st_mtime
+    _write_embeddings(_MEMORY_CACHE)
+
 def load_memory():
-    if os.path.exists(MEMORY_PATH):
-        with open(MEMORY_PATH, "r") as f:
-            return json.load(f)
-    return []
+    global _MEMORY_CACHE, _MEMORY_MTIME, _MEMORY_LINES
+    _migrate_legacy_memory()
+    try:
+        mtime = os.stat(MEMORY_PATH).st_mtime
+    except FileNotFoundError:
+        if _MEMORY_CACHE is None or _MEMORY_MTIME is not None:
+            _MEMORY_CACHE, _MEMORY_MTIME, _MEMORY_LINES = OrderedDict(), None, 0
+            _reset_index([])
+            _reset_tokens(_MEMORY_CACHE)
+        return _MEMORY_CACHE
+    if _MEMORY_CACHE is None or mtime != _MEMORY_MTIME:
+        memory = OrderedDict()
+        line_keys = []
+        needs_rewrite = False
+        for line in _read_memory_lines():
+            if not line.strip():
+                continue
+            # Yazma sırasında kesilen (yarım kalmış) satırlar atlanır; dosya
+            # aşağıda yeniden yazılır ki sonraki ekleme yarım satıra yapışmasın
+            if not line.endswith(b"\n"):
+                needs_rewrite = True
+            try:
+                entry = _json_loads(line)
+            except ValueError:
+                needs_rewrite = True
+                continue
+            # Normalize soru alanı olmayan eski kayıtlar bir kereliğine güncellenir
+            if "question_norm" not in entry:
+                entry["question_norm"] = _normalize_question(entry["question"])
+                needs_rewrite = True
+            key = entry["question_norm"]
+            memory[key] = entry
+            memory.move_to_end(key)
+            line_keys.append(key)
+        while len(memory) > MAX_MEMORY:
+            memory.popitem(last=False)
+        _MEMORY_CACHE, _MEMORY_MTIME, _MEMORY_LINES = memory, mtime, len(line_keys)
+        _reset_index(line_keys)
+        _reset_tokens(memory)
+        if needs_rewrite:
+            _compact_memory()
+    return _MEMORY_CACHE
+
+def _append_memory(entry):
+    global _MEMORY_LINES, _MEMORY_MTIME
+    vector = _remember_embedding(entry["question_norm"])
+    if _MEMORY_LINES >= MEMORY_COMPACT_THRESHOLD:
+        _compact_memory()
+        return
+    with open(MEMORY_PATH, "ab") as f:
+        f.write(_json_dumps(entry) + b"\n")
+    _MEMORY_LINES += 1
+    _append_embedding(vector)
+    _MEMORY_MTIME = os.stat(MEMORY_PATH).st_mtime
 
 def save_memory(entry):
     memory = load_memory()
-    memory.append(entry)
-    if len(memory) > MAX_MEMORY:
-        memory = memory[-MAX_MEMORY:]
-    with open(MEMORY_PATH, "w") as f:
-        json.dump(memory, f, indent=2)
+    key = entry.setdefault("question_norm", _normalize_question(entry["question"]))
+    memory[key] = entry
+    memory.move_to_end(key)
+    _index_tokens(key)
+    while len(memory) > MAX_MEMORY:
+        evicted, _ = memory.popitem(last=False)
+        _forget_embedding(evicted)
+        _forget_tokens(evicted)
+    _append_memory(entry)
+
+def touch_memory(entry):
+    """Önbellekten dönen kaydı en son kullanılan olarak işaretler."""
+    memory = load_memory()
+    memory.move_to_end(entry["question_norm"])
+    _append_memory(entry)
+
+# --- Semantik arama (embedding + HNSW) ---
+# Her sorunun embedding'i anahtarına göre tutulur ve HNSW indeksine bir kez
+# eklenir; indeks satırlarının hangi anahtara ait olduğu _INDEX_KEYS'te durur.
+# Hafızadan çıkarılan kayıtların satırları sıkıştırmaya kadar indekste kalır
+# ve aramada atlanır. Embedding dosyası hafıza dosyasıyla satır satır aynı
+# sıradadır; uyuşmazsa eksik embedding'ler hesaplanıp iki dosya sıkıştırılır.
+_EMBEDDER = None
+_INDEX = None
+_INDEX_KEYS: List[str] = []
+_VECTORS: dict = {}
+
+def _embedder():
+    global _EMBEDDER
+    if _EMBEDDER is None:
+        _EMBEDDER = SentenceTransformer(EMBEDDING_MODEL)
+    return _EMBEDDER
+
+def _embed(texts):
+    return _embedder().encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype("float32")
+
+@functools.lru_cache(maxsize=128)
+def _embed_question(question: str):
+    # retriever'da gömülen soru save_answer_node'da tekrar gömülmesin
+    return _embed([question])
+
+def _reset_index(line_keys):
+    """Hafıza yeniden yüklendiğinde geçerli embedding'leri diskten okur."""
+    global _INDEX, _VECTORS
+    if faiss is None:
+        return
+    _INDEX = None
+    _VECTORS = {}
+    if (line_keys and os.path.exists(MEMORY_EMBEDDINGS_PATH)
+            and os.stat(MEMORY_EMBEDDINGS_PATH).st_mtime >= os.stat(MEMORY_PATH).st_mtime):
+        dim = _embedder().get_sentence_embedding_dimension()
+        # Boyut satır sayısına tam uymuyorsa (yarım kalan ekleme, farklı boyutlu
+        # model) dosya geçersiz sayılır; embedding'ler _get_index'te yeniden hesaplanır
+        row_bytes = dim * np.dtype("float32").itemsize
+        if os.stat(MEMORY_EMBEDDINGS_PATH).st_size == len(line_keys) * row_bytes:
+            vectors = np.fromfile(MEMORY_EMBEDDINGS_PATH, dtype="float32").reshape(-1, dim)
+            _VECTORS = dict(zip(line_keys, vectors))
+
+def _write_embeddings(memory):
+    global _INDEX
+    if faiss is None:
+        return
+    _INDEX = None
+    if all(key in _VECTORS for key in memory):
+        rows = [_VECTORS[key] for key in memory]
+        dim = _embedder().get_sentence_embedding_dimension()
+        (np.stack(rows) if rows else np.empty((0, dim), dtype="float32")).tofile(MEMORY_EMBEDDINGS_PATH)
+    elif os.path.exists(MEMORY_EMBEDDINGS_PATH):
+        os.remove(MEMORY_EMBEDDINGS_PATH)
+
+def _get_index(memory):
+    global _INDEX, _INDEX_KEYS
+    if _INDEX is None:
+        missing = [key for key in memory if key not in _VECTORS]
+        if missing:
+            _VECTORS.update(zip(missing, _embed(missing)))
+            _compact_memory()
+        dim = _embedder().get_sentence_embedding_dimension()
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        keys = list(memory)
+        if keys:
+            index.add(np.stack([_VECTORS[key] for key in keys]))
+        _INDEX, _INDEX_KEYS = index, keys
+    return _INDEX
+
+def _remember_embedding(key):
+    """Anahtarın embedding'ini döndürür; yeni bir anahtarsa indekse de ekler."""
+    if faiss is None:
+        return None
+    vector = _VECTORS.get(key)
+    if vector is None:
+        vector = _VECTORS[key] = _embed_question(key)[0]
+        if _INDEX is not None:
+            _INDEX.add(vector[None, :])
+            _INDEX_KEYS.append(key)
+    return vector
+
+def _append_embedding(vector):
+    if vector is None:
+        return
+    with open(MEMORY_EMBEDDINGS_PATH, "ab") as f:
+        f.write(vector.tobytes())
+
+def _forget_embedding(key):
+    if faiss is not None:
+        _VECTORS.pop(key, None)
+
+def _semantic_lookup(query, memory):
+    index = _get_index(memory)
+    if index.ntotal == 0:
+        return None
+    # Çıkarılmış kayıtların satırları atlandığında da en az bir canlı kayıt
+    # kalacak kadar komşu istenir
+    k = index.ntotal - len(memory) + 1
+    scores, ids = index.search(_embed_question(query), k)
+    for score, i in zip(scores[0], ids[0]):
+        if i < 0 or score <= SIMILARITY_THRESHOLD:
+            break
+        entry = memory.get(_INDEX_KEYS[i])
+        if entry is not None:
+            return entry
+    return None
+
+# --- Kelime kümesi (Jaccard) araması ---
+# Semantik arama yoksa sorular kelime kümeleri arasındaki Jaccard benzerliğiyle
+# eşlenir. Her sorunun kelime kümesi kayıt eklenirken bir kez çıkarılır; ters
+# indeks (kelime -> anahtarlar) sayesinde yalnızca sorguyla ortak kelimesi olan
+# kayıtlar taranır, diğerlerinin benzerliği zaten sıfırdır.
+# Operatörler ve noktalama da kelime sayılır ("5+3" ile "3-5" ayrışsın), kümeye
+# ardışık kelime çiftleri de eklenir ki kelime sırası önemli olsun
+# ("12 divided by 4" ile "4 divided by 12" aynı soru sayılmasın).
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_TOKENS: dict = {}
+_POSTINGS: dict = {}
+
+def _question_tokens(question_norm: str) -> frozenset:
+    words = _TOKEN_RE.findall(question_norm)
+    return frozenset(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+def _index_tokens(key):
+    if key in _TOKENS:
+        return
+    tokens = _TOKENS[key] = _question_tokens(key)
+    for token in tokens:
+        _POSTINGS.setdefault(token, set()).add(key)
+
+def _forget_tokens(key):
+    for token in _TOKENS.pop(key, ()):
+        keys = _POSTINGS[token]
+        keys.discard(key)
+        if not keys:
+            del _POSTINGS[token]
+
+def _reset_tokens(memory):
+    _TOKENS.clear()
+    _POSTINGS.clear()
+    for key in memory:
+        _index_tokens(key)
+
+def _token_lookup(query, memory):
+    query_tokens = _question_tokens(query)
+    if not query_tokens:
+        return None
+    shared = {}
+    for token in query_tokens:
+        for key in _POSTINGS.get(token, ()):
+            shared[key] = shared.get(key, 0) + 1
+    best_key, best_score = None, JACCARD_THRESHOLD
+    for key, inter in shared.items():
+        score = inter / (len(query_tokens) + len(_TOKENS[key]) - inter)
+        if score > best_score:
+            best_key, best_score = key, score
+    return memory[best_key] if best_key is not None else None
 
 # --- State Tanımı ---
 class MessagesStateWithFlag(TypedDict):
-    messages: List[BaseMessage]
+    # Düğümler yalnızca yeni mesajları döndürür, LangGraph operator.add ile
+    # bunları geçmişe ekler. Birleştirme yine yeni bir liste kurar; değişen şey
+    # düğümlerin geçmişi kendilerinin kopyalayıp döndürmemesidir.
+    messages: Annotated[List[BaseMessage], operator.add]
     retrieved_answer_found: Optional[bool]
+    current_question: Optional[str]
 
 # --- Retriever Node ---
 def retriever(state: MessagesStateWithFlag) -> MessagesStateWithFlag:
-    query = state["messages"][-1].content.strip().lower()
+    question = state["messages"][-1].content
+    query = _normalize_question(question)
     memory = load_memory()
-    for entry in memory:
-        question = entry["question"].strip().lower()
-        similarity = difflib.SequenceMatcher(None, question, query).ratio()
-        if similarity > 0.9:
-            return {
-                "messages": [sys_msg, AIMessage(content=f"{entry['answer']}")],
-                "retrieved_answer_found": True
-            }
-    return {"messages": state["messages"], "retrieved_answer_found": False}
+    if faiss is not None:
+        match = _semantic_lookup(query, memory)
+    else:
+        match = _token_lookup(query, memory)
+    if match is not None:
+        touch_memory(match)
+        return {
+            "messages": [AIMessage(content=f"{match['answer']}")],
+            "retrieved_answer_found": True,
+            "current_question": question
+        }
+    return {"retrieved_answer_found": False, "current_question": question}
 
 # --- Assistant Node ---
 def assistant(state: MessagesStateWithFlag) -> MessagesStateWithFlag:
-    messages = [sys_msg] + state["messages"]
-    prompt = "\n".join([m.content for m in messages if hasattr(m, "content")])
+    # Statik system prompt her turda birebir aynı önek olarak en başta gider,
+    # dinamik içerik sonda kalır; böylece sunucu tarafındaki önek (prefix)
+    # önbelleği system prompt'un hesaplamasını turlar arasında yeniden kullanır.
+    prompt = SYSTEM_PREFIX + "\n".join(
+        m.content for m in state["messages"] if hasattr(m, "content") and not isinstance(m, SystemMessage)
+    )
     response = llm_with_tools.invoke(prompt)
     if isinstance(response, dict):
         response_text = response.get("generated_text", str(response))
     else:
         response_text = str(response)
-    return {"messages": state["messages"] + [AIMessage(content=response_text)], "retrieved_answer_found": False}
+    return {"messages": [AIMessage(content=response_text)], "retrieved_answer_found": False}
 # --- Tool Executor Node ---
 def tool_executor_node(state: MessagesStateWithFlag) -> MessagesStateWithFlag:
     last_msg = state["messages"][-1]
     if not isinstance(last_msg, AIMessage) or not last_msg.tool_calls:
-        return state
-    results = tool_executor.invoke(last_msg.tool_calls)
+        return {"retrieved_answer_found": False}
+    tool_calls = last_msg.tool_calls
+    results = tool_executor.invoke(tool_calls)
+    dumps, make_message = _json_dumps, ToolMessage
     tool_messages = [
-        ToolMessage(content=json.dumps(result), tool_call_id=call['id'])
-        for call, result in zip(last_msg.tool_calls, results)
+        make_message(content=dumps(result).decode(), tool_call_id=call['id'])
+        for call, result in zip(tool_calls, results)
     ]
-    return {"messages": state["messages"] + tool_messages, "retrieved_answer_found": False}
+    return {"messages": tool_messages, "retrieved_answer_found": False}
 
 # --- Save Answer Node ---
 def save_answer_node(state: MessagesStateWithFlag) -> MessagesStateWithFlag:
-    question = next((m.content for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), "")
+    question = state.get("current_question") or ""
     answer = state["messages"][-1].content
     save_memory({"question": question, "answer": answer})
-    return state
+    return {}
 
 # --- Geçiş Kuralı ---
 def should_continue(state: MessagesStateWithFlag) -> str:
@@ -122,6 +445,10 @@ def should_continue(state: MessagesStateWithFlag) -> str:
 
 # --- Graph Tanımı ---
 def build_graph():
+    if faiss is not None:
+        # Embedding modeli ve HNSW indeksi ilk soruda değil, graf kurulurken
+        # bir kez yüklenir; soğuk başlangıç gecikmesi kullanıcıya yansımaz.
+        _get_index(load_memory())
     builder = StateGraph(MessagesStateWithFlag)
     builder.set_entry_point("retriever")
     builder.add_node("retriever", retriever)
@@ -0,0 +1,29 @@
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def load_agent(tmp_path, monkeypatch):
+    """agent.py'yi tmp_path'ten yükler; hafıza dosyaları da orada oluşur.
+
+    Her çağrı modülü baştan yükler, yani sürecin yeniden başlatılması gibidir.
+    """
+    shutil.copy(os.path.join(REPO_DIR, "agent.py"), tmp_path)
+    (tmp_path / "system_prompt.txt").write_text("test")
+    monkeypatch.syspath_prepend(REPO_DIR)
+    monkeypatch.setenv("HF_TOKEN", "test")
+
+    def load():
+        spec = importlib.util.spec_from_file_location("agent_under_test", tmp_path / "agent.py")
+        agent = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(agent)
+        return agent
+
+    yield load
+    sys.modules.pop("agent_under_test", None)
@@ -0,0 +1,17 @@
+import json
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("langchain_huggingface")
+
+from langchain_core.messages import AIMessage
+
+
+def test_tool_executor_serializes_big_int_results(load_agent):
+    agent = load_agent()
+    call = {"name": "multiply", "args": {"a": 10**10, "b": 10**10}, "id": "call-1"}
+    result = agent.tool_executor_node({"messages": [AIMessage(content="", tool_calls=[call])]})
+    (message,) = result["messages"]
+    assert message.tool_call_id == "call-1"
+    assert json.loads(message.content) == 10**20
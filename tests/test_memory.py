@@ -0,0 +1,119 @@
+import hashlib
+import os
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("langchain_huggingface")
+np = pytest.importorskip("numpy")
+faiss = pytest.importorskip("faiss")
+
+from langchain_core.messages import HumanMessage
+
+EMBEDDING_DIM = 32
+
+
+class FakeEmbedder:
+    """Karakter üçlülerinden deterministik embedding üreten test modeli."""
+    encoded = 0
+
+    def __init__(self, name):
+        pass
+
+    def get_sentence_embedding_dimension(self):
+        return EMBEDDING_DIM
+
+    def encode(self, texts, normalize_embeddings, convert_to_numpy):
+        FakeEmbedder.encoded += len(texts)
+        vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype="float32")
+        for i, text in enumerate(texts):
+            for j in range(len(text) - 2):
+                bucket = hashlib.md5(text[j:j + 3].encode()).digest()[0] % EMBEDDING_DIM
+                vectors[i, bucket] += 1
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def start_agent(load_agent):
+    """Küçük hafıza sınırlarıyla agent'ı yükler; her çağrı bir yeniden başlatmadır."""
+    def start(semantic=True):
+        agent = load_agent()
+        agent.MAX_MEMORY = 3
+        agent.MEMORY_COMPACT_THRESHOLD = 5
+        if semantic:
+            agent.faiss, agent.np, agent.SentenceTransformer = faiss, np, FakeEmbedder
+        else:
+            agent.faiss = None
+        return agent
+
+    return start
+
+
+def ask(agent, question, answer):
+    """Grafın yaptığı gibi önce retriever'ı çalıştırır, bulunamazsa cevabı kaydeder."""
+    result = agent.retriever({"messages": [HumanMessage(content=question)]})
+    if result["retrieved_answer_found"]:
+        return result["messages"][-1].content
+    agent.save_memory({"question": question, "answer": answer})
+    return None
+
+
+def line_count(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def embedding_rows(path):
+    return os.path.getsize(path) // (EMBEDDING_DIM * 4)
+
+
+def answers(agent):
+    return [entry["answer"] for entry in agent.load_memory().values()]
+
+
+def assert_files_in_sync(agent):
+    assert line_count(agent.MEMORY_PATH) == agent._MEMORY_LINES
+    assert embedding_rows(agent.MEMORY_EMBEDDINGS_PATH) == agent._MEMORY_LINES
+
+
+def test_lru_eviction_survives_restart_and_compaction(start_agent):
+    agent = start_agent()
+    for topic in "abc":
+        assert ask(agent, f"tell me about topic {topic * 6}", topic) is None
+    assert ask(agent, "tell me about topic aaaaaa", "-") == "a"
+    ask(agent, "tell me about topic dddddd", "d")
+
+    # b en uzun süredir kullanılmayan kayıttı; a'ya erişim onu sona taşıdı
+    assert answers(agent) == ["c", "a", "d"]
+    assert agent._MEMORY_LINES == 5
+    assert_files_in_sync(agent)
+
+    agent = start_agent()
+    encoded = FakeEmbedder.encoded
+    assert answers(agent) == ["c", "a", "d"]
+    assert ask(agent, "tell me about topic bbbbbb", "b2") is None
+    # Yeniden başlatmada kayıtlı sorular tekrar gömülmez; yalnızca sorgu ve yeni kayıt
+    assert FakeEmbedder.encoded - encoded == 1
+
+    # Dosya sınırı aştığı için son kayıtla birlikte sıkıştırılır
+    assert answers(agent) == ["a", "d", "b2"]
+    assert agent._MEMORY_LINES == 3
+    assert_files_in_sync(agent)
+
+    agent = start_agent()
+    assert answers(agent) == ["a", "d", "b2"]
+    assert ask(agent, "tell me about topic cccccc", "-") is None
+    assert ask(agent, "tell me about topic dddddd", "-") == "d"
+    assert_files_in_sync(agent)
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("What is 5+3?", "What is 3-5?"),
+    ("What is 5+3?", "What is 5*3?"),
+    ("what is 12 divided by 4?", "what is 4 divided by 12?"),
+])
+def test_token_lookup_keeps_operators_and_order(start_agent, stored, asked):
+    agent = start_agent(semantic=False)
+    ask(agent, stored, "stored")
+    assert ask(agent, asked, "new") is None
+    assert ask(agent, f"  {stored.upper()} ", "-") == "stored"
@@ -0,0 +1,18 @@
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from tools import _get_video_id_from_url
+
+
+@pytest.mark.parametrize("url, video_id", [
+    ("https://www.youtube.com/watch?v=L1vXCYZAYYM", "L1vXCYZAYYM"),
+    ("https://www.youtube.com/watch?list=PL1&v=L1vXCYZAYYM&t=42s", "L1vXCYZAYYM"),
+    ("https://youtu.be/L1vXCYZAYYM?si=abc", "L1vXCYZAYYM"),
+    ("https://www.youtube.com/watch?v=L1vXCYZAYYMextra", None),
+    ("https://youtu.be/L1vXCYZAYYM-x", None),
+    ("https://www.youtube.com/watch?v=short", None),
+    ("https://example.com/watch", None),
+])
+def test_get_video_id_from_url(url, video_id):
+    assert _get_video_id_from_url(url) == video_id
@@ -1,9 +1,25 @@
+import functools
+import os
+import re
 from langchain_community.tools import tool
-from langchain_community.document_loaders import WikipediaLoader, ArxivLoader
-from langchain_community.tools.tavily_search import TavilySearchResults
-import openai
-from youtube_transcript_api import YouTubeTranscriptApi
-from urllib.parse import urlparse, parse_qs
+
+# Ağır bağımlılıklar (Wikipedia/Arxiv yükleyicileri, Tavily, OpenAI, YouTube)
+# modül yüklenirken değil, ilgili araç ilk çağrıldığında import edilir.
+
+# Harici API'lere giden aramaların sonuçları süreç içinde önbelleklenir;
+# aynı sorgu tekrarlandığında HTTP isteği yapılmaz. Hatalar önbelleğe alınmaz.
+TOOL_CACHE_SIZE = 512
+
+# Çok uzun altyazılar LLM'in context limitini aşmamak için kırpılır
+TRANSCRIPT_MAX_CHARS = 15000  # Yaklaşık 3500-4000 token
+
+def _doc_record(doc, max_chars: int | None = None) -> dict:
+    """Bir LangChain Document'ını araç çıktısında kullanılan sade sözlüğe çevirir."""
+    return {
+        "source": doc.metadata["source"],
+        "page": doc.metadata.get("page", ""),
+        "content": doc.page_content[:max_chars] if max_chars else doc.page_content,
+    }
 
 @tool
 def multiply(a: int, b: int) -> int:
@@ -57,69 +73,97 @@ def modulus(a: int, b: int) -> int:
     return a % b
 
 @tool
-def wiki_search(query: str) -> str:
+def wiki_search(query: str) -> dict:
     """Search Wikipedia for a query and return maximum 2 results.
     
     Args:
         query: The search query."""
+    return {"wiki_results": _wiki_search(query)}
+
+@functools.lru_cache(maxsize=TOOL_CACHE_SIZE)
+def _wiki_search(query: str) -> tuple[dict, ...]:
+    from langchain_community.document_loaders import WikipediaLoader
     search_docs = WikipediaLoader(query=query, load_max_docs=2).load()
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
-            for doc in search_docs
-        ])
-    return {"wiki_results": formatted_search_docs}
+    return tuple(_doc_record(doc) for doc in search_docs)
 
 @tool
-def web_search(query: str) -> str:
+def web_search(query: str) -> dict:
     """Search Tavily for a query and return maximum 3 results.
     
     Args:
         query: The search query."""
-    search_docs = TavilySearchResults(max_results=3).invoke(query=query)
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
-            for doc in search_docs
-        ])
-    return {"web_results": formatted_search_docs}
+    return {"web_results": _web_search(query)}
+
+@functools.lru_cache(maxsize=1)
+def _tavily():
+    from langchain_community.tools.tavily_search import TavilySearchResults
+    # Araç nesnesi her aramada yeniden kurulmasın diye tek örnek tutulur; API
+    # anahtarı import sırasında değil ilk aramada doğrulanır. Bağlantılar yeniden
+    # kullanılmaz: sarmalayıcı her istekte modül düzeyindeki requests.post'u
+    # çağırır ve bir Session verilmesine izin vermez.
+    return TavilySearchResults(max_results=3)
+
+@functools.lru_cache(maxsize=TOOL_CACHE_SIZE)
+def _web_search(query: str) -> tuple[dict, ...]:
+    # Tavily sonuçları Document değil, {"url", "content"} sözlükleridir
+    search_results = _tavily().invoke(query)
+    if isinstance(search_results, str):
+        # Tavily API hatalarını yakalayıp repr(e) olarak döndürür; önbelleğe
+        # girmesin ve modele gerçek hata iletilsin diye hata olarak yükseltilir
+        raise RuntimeError(f"Tavily araması başarısız: {search_results}")
+    return tuple(
+        {"source": result["url"], "page": "", "content": result["content"]}
+        for result in search_results
+    )
 
 @tool
-def arvix_search(query: str) -> str:
+def arvix_search(query: str) -> dict:
     """Search Arxiv for a query and return maximum 3 result.
     
     Args:
         query: The search query."""
+    return {"arvix_results": _arvix_search(query)}
+
+@functools.lru_cache(maxsize=TOOL_CACHE_SIZE)
+def _arvix_search(query: str) -> tuple[dict, ...]:
+    from langchain_community.document_loaders import ArxivLoader
     search_docs = ArxivLoader(query=query, load_max_docs=3).load()
-    formatted_search_docs = "\n\n---\n\n".join(
-        [
-            f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content[:1000]}\n</Document>'
-            for doc in search_docs
-        ])
-    return {"arvix_results": formatted_search_docs}
+    return tuple(_doc_record(doc, max_chars=1000) for doc in search_docs)
+
+# youtu.be/<id> veya ...?v=<id> biçimindeki URL'lerden 11 karakterlik video ID'si;
+# ID'den sonra gelen fazladan karakterler geçersiz URL sayılır
+_YT_RE = re.compile(r"(?:youtu\.be/|[?&]v=)([A-Za-z0-9_-]{11})(?![\w-])")
 
 def _get_video_id_from_url(url: str) -> str | None:
     """Verilen YouTube URL'sinden video ID'sini çıkarır."""
-    if "youtu.be" in url:
-        return url.split("/")[-1].split("?")[0]
-    
-    query = urlparse(url).query
-    params = parse_qs(query)
-    
-    if 'v' in params:
-        return params['v'][0]
-    
-    return None
+    match = _YT_RE.search(url)
+    return match.group(1) if match else None
 
 def _get_transcript(video_id: str) -> str | None:
     """Belirtilen video ID'si için altyazıyı çeker ve metin olarak birleştirir."""
     try:
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['tr', 'en'])
-        return " ".join([item['text'] for item in transcript_list])
+        return _fetch_transcript(video_id)
     except Exception as e:
         print(f"Altyazı alınırken hata: {e}")
         return None
 
+@functools.lru_cache(maxsize=TOOL_CACHE_SIZE)
+def _fetch_transcript(video_id: str) -> str:
+    from youtube_transcript_api import YouTubeTranscriptApi
+    transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['tr', 'en'])
+    # Tüm altyazıyı birleştirmek yerine sınır aşılana kadar biriktirilir; fazlası
+    # zaten kırpılacağı için uzun videolarda kullanılmayacak metin üretilmez.
+    # Sınırı aşan tek karakter, kırpılıp kırpılmadığını anlamak için tutulur.
+    parts = []
+    length = -1
+    for item in transcript_list:
+        text = item['text']
+        parts.append(text)
+        length += len(text) + 1
+        if length > TRANSCRIPT_MAX_CHARS:
+            break
+    return " ".join(parts)[:TRANSCRIPT_MAX_CHARS + 1]
+
 @tool
 def get_youtube_transcript(video_url: str) -> str:
     """
@@ -134,11 +178,11 @@ def get_youtube_transcript(video_url: str) -> str:
         return "HATA: Geçersiz YouTube URL'si."
 
     transcript = _get_transcript(video_id)
+    if transcript is None:
+        return "HATA: Videonun altyazısı alınamadı."
     
-    # Çok uzun metinleri LLM'in context limitini aşmamak için kırpalım
-    max_chars = 15000  # Yaklaşık 3500-4000 token
-    if len(transcript) > max_chars:
-        trimmed_transcript = transcript[:max_chars]
+    if len(transcript) > TRANSCRIPT_MAX_CHARS:
+        trimmed_transcript = transcript[:TRANSCRIPT_MAX_CHARS]
         return trimmed_transcript + "\n\n[...NOT: Metin çok uzun olduğu için kırpılmıştır...]"
         
     return transcript
@@ -153,13 +197,21 @@ def transcribe_audio(audio_file_path: str) -> str:
     """
     print(f"--- Audio Transcription Tool Called: {audio_file_path} ---")
     try:
-        with open(audio_file_path, "rb") as audio_file:
-            # Whisper API'sini çağır
-            transcript = openai.Audio.transcribe("whisper-1", audio_file)
+        # Dosya değişmediği sürece (yol, mtime, boyut) aynı döküm yeniden kullanılır
+        stat = os.stat(audio_file_path)
+        text = _transcribe_audio(audio_file_path, stat.st_mtime, stat.st_size)
         
         print("--- Transcription Successful ---")
-        return transcript['text']
+        return text
     except FileNotFoundError:
         return f"HATA: Belirtilen yolda dosya bulunamadı: {audio_file_path}"
     except Exception as e:
-        return f"HATA: Ses dosyası işlenirken bir sorun oluştu: {e}"
\ No newline at end of file
+        return f"HATA: Ses dosyası işlenirken bir sorun oluştu: {e}"
+
+@functools.lru_cache(maxsize=TOOL_CACHE_SIZE)
+def _transcribe_audio(audio_file_path: str, mtime: float, size: int) -> str:
+    import openai
+    with open(audio_file_path, "rb") as audio_file:
+        # Whisper API'sini çağır
+        transcript = openai.Audio.transcribe("whisper-1", audio_file)
+    return transcript['text']
\ No newline at end of file